@@ -1,13 +1,19 @@
-from multimethod import multimethod
-
-
 class RiscIntegerException(Exception):
     pass
 
 
 class RiscInteger:
-    @multimethod
-    def __init__(self, value: int, signed: bool = True):
+    __slots__ = ('value',)
+
+    def __init__(self, value, signed: bool = True):
+        if isinstance(value, list):
+            self.value = RiscInteger.decode_pattern(value)
+            return
+        elif not isinstance(value, int):
+            raise RiscIntegerException(
+                f'Cannot construct RISC integer from "{value}"'
+            )
+
         if signed and (value < -2**31 or value >= 2**31):
             raise RiscIntegerException(
                 f'Value "{value}" out of range for a signed RISC integer'
@@ -17,124 +23,135 @@ class RiscInteger:
                 f'Value "{value}" out of range for an unsigned RISC integer'
             )
 
-        self.bits = []
-        for _ in range(32):
-            self.bits.append(value & 1 > 0)
-            value = value >> 1
-
-    @multimethod
-    def __init__( # noqa
-        self,
-        pattern: list
-    ):
-        bits = []
-        for value in pattern:
-            if isinstance(value, bool):
-                bits.append(value)
+        self.value = value & 0xFFFFFFFF
+
+    @classmethod
+    def from_word(cls, word: int) -> 'RiscInteger':
+        # Wrap an unsigned value already known to fit in 32 bits, skipping
+        # the checks done by the constructor
+        integer = cls.__new__(cls)
+        integer.value = word
+        return integer
+
+    @staticmethod
+    def decode_pattern(pattern: list) -> int:
+        acc = 0
+        pos = 0
+        for part in pattern:
+            # Checks are ordered by how often each kind of part shows up;
+            # encoding an instruction uses (value, length) tuples throughout
+            if isinstance(part, tuple) and len(part) == 2:
+                value, length = part
+                if isinstance(length, int) and length >= 0:
+                    if isinstance(value, RiscInteger):
+                        value = value.value
+                        length = min(length, 32)
+
+                    if isinstance(value, int):
+                        acc |= (value & ((1 << length) - 1)) << pos
+                        pos += length
+                        continue
+            elif isinstance(part, bool):
+                acc |= part << pos
+                pos += 1
                 continue
-            elif isinstance(value, tuple) and len(value) == 2:
-                if isinstance(value[0], int) and isinstance(value[1], int):
-                    value, length = value
-                    for i in range(length):
-                        bits.append(value & 1 > 0)
-                        value = value >> 1
-                    continue
-                elif (isinstance(value[0], RiscInteger) and
-                      isinstance(value[1], int)):
-                    value, length = value
-                    bits += value.bits[:length]
-                    continue
-            elif (isinstance(value, list) and
-                  all(isinstance(v, bool) for v in value)):
-                bits += value
+            elif isinstance(part, list) and \
+                    all(isinstance(bit, bool) for bit in part):
+                for bit in part:
+                    acc |= bit << pos
+                    pos += 1
                 continue
 
             raise RiscIntegerException(
-                f'Cannot decode "{value}" as RISC integer part'
+                f'Cannot decode "{part}" as RISC integer part'
             )
 
-        if len(bits) != 32:
+        if pos != 32:
             raise RiscIntegerException('Bitvector must be 32 bits long')
 
-        self.bits = bits
+        return acc
 
     @property
-    def sign_bit(self) -> bool:
-        return self.bits[31]
+    def bits(self) -> list:
+        return [bool((self.value >> i) & 1) for i in range(32)]
 
-    @multimethod
-    def __add__(self, other: 'RiscInteger'):
-        carry = False
-        bits = []
-        for i in range(32):
-            bit = self.bits[i] ^ other.bits[i] ^ carry
-            carry = self.bits[i] and other.bits[i] or \
-                carry and (self.bits[i] ^ other.bits[i])
-            bits.append(bit)
+    @property
+    def sign_bit(self) -> bool:
+        return bool(self.value >> 31)
 
-        return RiscInteger(bits)
+    def __add__(self, other) -> 'RiscInteger':
+        if isinstance(other, int):
+            other = RiscInteger(other)
 
-    @multimethod
-    def __add__(self, other: int) -> 'RiscInteger':  # noqa
-        return self + RiscInteger(other)
+        return RiscInteger.from_word((self.value + other.value) & 0xFFFFFFFF)
 
     def __neg__(self) -> 'RiscInteger':
-        return RiscInteger([not b for b in self.bits]) + RiscInteger(1)
+        return RiscInteger.from_word(-self.value & 0xFFFFFFFF)
 
-    def __sub__(self, other: 'RiscInteger') -> 'RiscInteger':
-        return self + (-other)
+    def __sub__(self, other) -> 'RiscInteger':
+        if isinstance(other, int):
+            return self + (-other)
 
-    def compare_unsigned(self, other: 'RiscInteger') -> bool:
-        for i in reversed(range(32)):
-            if self.bits[i] < other.bits[i]:
-                return True
-            elif self.bits[i] > other.bits[i]:
-                return False
+        return RiscInteger.from_word((self.value - other.value) & 0xFFFFFFFF)
 
-        return False
+    # RISC-V arithmetic wraps around silently; these tell whether the signed
+    # result of adding or subtracting wrapped, without needing a carry
 
-    @multimethod
-    def __lt__(self, other: 'RiscInteger') -> bool:
-        unsigned_comp = self.compare_unsigned(other)
-        return unsigned_comp ^ self.sign_bit ^ other.sign_bit
+    def add_overflows(self, other: 'RiscInteger') -> bool:
+        a, b = self.value, other.value
+        result = (a + b) & 0xFFFFFFFF
+        return bool(~(a ^ b) & (a ^ result) & 0x80000000)
 
-    @multimethod
-    def __lt__(self, other: int) -> bool: # noqa
-        return self < RiscInteger(other)
+    def sub_overflows(self, other: 'RiscInteger') -> bool:
+        a, b = self.value, other.value
+        result = (a - b) & 0xFFFFFFFF
+        return bool((a ^ b) & (a ^ result) & 0x80000000)
+
+    def compare_unsigned(self, other: 'RiscInteger') -> bool:
+        return self.value < other.value
+
+    def __lt__(self, other) -> bool:
+        if isinstance(other, int):
+            other = RiscInteger(other)
+
+        # Flipping the sign bit maps signed order onto unsigned order
+        return (self.value ^ 0x80000000) < (other.value ^ 0x80000000)
 
     def __ge__(self, other) -> bool:
         return not (self < other)
 
     def __getitem__(self, key):
         if isinstance(key, slice):
+            start, stop, step = key.indices(32)
+            if step == 1:
+                if stop <= start:
+                    return 0
+                return (self.value >> start) & ((1 << (stop - start)) - 1)
+
             value = 0
-            for exp, i in enumerate(range(*key.indices(len(self.bits)))):
-                if self.bits[i]:
+            for exp, i in enumerate(range(start, stop, step)):
+                if (self.value >> i) & 1:
                     value += 2**exp
 
             return value
         elif isinstance(key, int):
-            return self.bits[key]
+            # Index like the list of bits would, without building it
+            if key < -32 or key >= 32:
+                raise IndexError('RiscInteger index out of range')
 
-    def to_int(self, signed=True):
-        as_int = 0
-        for i in range(31):
-            if self.bits[i]:
-                as_int += 2**i
+            return bool(self.value >> (key % 32) & 1)
 
-        if self.sign_bit:
-            if signed:
-                as_int += -2**31
-            else:
-                as_int += 2**31
+    def to_int(self, signed=True):
+        if signed:
+            return (self.value ^ 0x80000000) - 0x80000000
 
-        return as_int
+        return self.value
 
     def to_bitstring(self):
-        return ''.join('1' if b else '0' for b in self.bits[::-1])
+        return f'{self.value:032b}'
 
     def to_hex(self):
-        return f'0x{self.to_int(False):08X}'
+        return f'0x{self.value:08X}'
 
     def __str__(self):
         return str(self.to_int())
@@ -143,30 +160,25 @@ class RiscInteger:
         return f'RiscInteger({self.to_int()})'
 
     def __rshift__(self, positions):
-        if positions > 32:
-            # Do not fill in too many zeroes
-            positions = 32
-
-        return RiscInteger(self.bits[positions:] + [False] * positions)
+        # Do not shift beyond the width of the word
+        return RiscInteger.from_word(self.value >> min(positions, 32))
 
     def __lshift__(self, positions):
-        if positions == 0:
-            # Slicing self.bits[:0] is a special case
-            return self
-        elif positions > 32:
-            # Do not fill in too many zeroes
-            positions = 32
-
-        return RiscInteger([False] * positions + self.bits[:-positions])
+        return RiscInteger.from_word(
+            (self.value << min(positions, 32)) & 0xFFFFFFFF
+        )
 
     def __or__(self, other):
-        return RiscInteger([self.bits[i] or other.bits[i] for i in range(32)])
+        return RiscInteger.from_word(self.value | other.value)
 
     def __and__(self, other):
-        return RiscInteger([self.bits[i] and other.bits[i] for i in range(32)])
+        return RiscInteger.from_word(self.value & other.value)
+
+    def __xor__(self, other):
+        return RiscInteger.from_word(self.value ^ other.value)
 
     def __eq__(self, other):
-        return self.bits == other.bits
+        return isinstance(other, RiscInteger) and self.value == other.value
 
     def __hash__(self):
-        return hash(tuple(self.bits))
+        return self.value
@@ -1,10 +1,14 @@
+from typing import List, Tuple
+
 from riscv.instruction import \
     ITypeRiscInstruction, RTypeRiscInstruction, RiscInstruction
+from riscv.data import RiscInteger
 from riscv.machine import RiscMachine
 
 
 @RiscInstruction.register_instruction('add')
 class AddRiscInstruction(RTypeRiscInstruction):
+    __slots__ = ()
     OPCODE = 0b0110011
     FUNCT3 = 0b000
     FUNCT7 = 0b0000000
@@ -12,20 +16,50 @@ class AddRiscInstruction(RTypeRiscInstruction):
     def run(self, machine: RiscMachine) -> None:
         machine.write_register(
             self.rd,
-            machine.read_register(self.rs1) +
-            machine.read_register(self.rs2)
+            RiscInteger.from_word(
+                (machine.read_register_raw(self.rs1) +
+                 machine.read_register_raw(self.rs2)) & 0xFFFFFFFF
+            )
         )
         machine.program_counter += 4
 
+    def source(
+        self,
+        location: int,
+        writable: Tuple[bool, ...]
+    ) -> List[str]:
+        return [self.write_source(
+            self.rd,
+            f'RiscInteger.from_word((registers[{self.rs1}].value + '
+            f'registers[{self.rs2}].value) & 0xFFFFFFFF)',
+            writable
+        )]
+
 
 @RiscInstruction.register_instruction('addi')
 class AddImmediateRiscInstruction(ITypeRiscInstruction):
+    __slots__ = ()
     OPCODE = 0b0010011
     FUNCT3 = 0b000
 
     def run(self, machine: RiscMachine) -> None:
         machine.write_register(
             self.rd,
-            machine.read_register(self.rs1) + self.n
+            RiscInteger.from_word(
+                (machine.read_register_raw(self.rs1) + self.n_int) &
+                0xFFFFFFFF
+            )
         )
         machine.program_counter += 4
+
+    def source(
+        self,
+        location: int,
+        writable: Tuple[bool, ...]
+    ) -> List[str]:
+        return [self.write_source(
+            self.rd,
+            f'RiscInteger.from_word((registers[{self.rs1}].value + '
+            f'{self.n_int}) & 0xFFFFFFFF)',
+            writable
+        )]
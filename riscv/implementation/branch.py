@@ -1,42 +1,70 @@
+from typing import List, Tuple
+
 from riscv.instruction import SBTypeRiscInstruction, RiscInstruction
 from riscv.machine import RiscMachine
 
 
 class BranchRiscInstruction(SBTypeRiscInstruction):
+    __slots__ = ()
     OPCODE = 0b1100011
 
-    def condition(self, machine):
-        raise NotImplementedError
+    def source(
+        self,
+        location: int,
+        writable: Tuple[bool, ...]
+    ) -> List[str]:
+        condition = self.CONDITION.format(rs1=self.rs1, rs2=self.rs2)
+        return [
+            f'if {condition}:',
+            f'    machine.program_counter = {location + self.offset_int}',
+            'else:',
+            f'    machine.program_counter = {location + 4}',
+        ]
 
-    def run(self, machine: RiscMachine) -> None:
-        if self.condition(machine):
-            machine.program_counter += self.offset.to_int()
-        else:
-            machine.program_counter += 4
 
+# CONDITION is the branch condition over raw register values, for use in
+# generated code; for bge and blt, XOR-ing the sign bit lets the signed
+# comparison be done on those values.
 
 @RiscInstruction.register_instruction('beq')
 class BranchEqualRiscInstruction(BranchRiscInstruction):
+    __slots__ = ()
     FUNCT3 = 0b000
+    CONDITION = 'registers[{rs1}].value == registers[{rs2}].value'
 
-    def condition(self, machine):
-        return machine.read_register(self.rs1) == \
-               machine.read_register(self.rs2)
+    def run(self, machine: RiscMachine) -> None:
+        if machine.read_register_raw(self.rs1) == \
+           machine.read_register_raw(self.rs2):
+            machine.program_counter += self.offset_int
+        else:
+            machine.program_counter += 4
 
 
 @RiscInstruction.register_instruction('bge')
 class BranchGreaterEqualRiscInstruction(BranchRiscInstruction):
+    __slots__ = ()
     FUNCT3 = 0b101
+    CONDITION = '(registers[{rs1}].value ^ 0x80000000) >= ' \
+        '(registers[{rs2}].value ^ 0x80000000)'
 
-    def condition(self, machine):
-        return machine.read_register(self.rs1) >= \
-               machine.read_register(self.rs2)
+    def run(self, machine: RiscMachine) -> None:
+        if (machine.read_register_raw(self.rs1) ^ 0x80000000) >= \
+           (machine.read_register_raw(self.rs2) ^ 0x80000000):
+            machine.program_counter += self.offset_int
+        else:
+            machine.program_counter += 4
 
 
 @RiscInstruction.register_instruction('blt')
 class BranchLessThanRiscInstruction(BranchRiscInstruction):
+    __slots__ = ()
     FUNCT3 = 0b100
+    CONDITION = '(registers[{rs1}].value ^ 0x80000000) < ' \
+        '(registers[{rs2}].value ^ 0x80000000)'
 
-    def condition(self, machine):
-        return machine.read_register(self.rs1) < \
-               machine.read_register(self.rs2)
+    def run(self, machine: RiscMachine) -> None:
+        if (machine.read_register_raw(self.rs1) ^ 0x80000000) < \
+           (machine.read_register_raw(self.rs2) ^ 0x80000000):
+            machine.program_counter += self.offset_int
+        else:
+            machine.program_counter += 4
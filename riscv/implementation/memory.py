@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import List, Tuple
 
 from riscv.instruction import \
     ITypeRiscInstruction, STypeRiscInstruction, RiscInstruction
@@ -7,6 +7,8 @@ from riscv.machine import RiscMachine
 
 @RiscInstruction.register_instruction('lw')
 class LoadWordRiscInstruction(ITypeRiscInstruction):
+    __slots__ = ()
+    FORMAT = STypeRiscInstruction.FORMAT
     OPCODE = 0b0000011
     FUNCT3 = 0b10
 
@@ -16,18 +18,37 @@ class LoadWordRiscInstruction(ITypeRiscInstruction):
         self.rs1 = RiscInstruction.parse_register(parts[2])
 
     def run(self, machine: RiscMachine) -> None:
+        address = (machine.read_register_raw(self.rs1) + self.n_int) & \
+            0xFFFFFFFF
         machine.write_register(
             self.rd,
-            machine.read_memory(machine.read_register(self.rs1) + self.n),
+            machine.read_memory_raw(address),
         )
         machine.program_counter += 4
 
+    def source(
+        self,
+        location: int,
+        writable: Tuple[bool, ...]
+    ) -> List[str]:
+        # Memory accesses may raise, so the program counter is kept exact
+        return [
+            f'machine.program_counter = {location}',
+            self.write_source(
+                self.rd,
+                f'machine.read_memory_raw((registers[{self.rs1}].value + '
+                f'{self.n_int}) & 0xFFFFFFFF)',
+                writable
+            )
+        ]
+
     def assembly(self) -> str:
         return f'{self.mnemonic} x{self.rd}, {self.n}(x{self.rs1})'
 
 
 @RiscInstruction.register_instruction('sw')
 class StoreWordRiscInstruction(STypeRiscInstruction):
+    __slots__ = ()
     OPCODE = 0b0100011
     FUNCT3 = 0b010
 
@@ -37,11 +58,25 @@ class StoreWordRiscInstruction(STypeRiscInstruction):
         self.rs1 = RiscInstruction.parse_register(parts[2])
 
     def run(self, machine: RiscMachine) -> None:
-        machine.write_memory(
-            machine.read_register(self.rs1) + self.n,
+        address = (machine.read_register_raw(self.rs1) + self.n_int) & \
+            0xFFFFFFFF
+        machine.write_memory_raw(
+            address,
             machine.read_register(self.rs2),
         )
         machine.program_counter += 4
 
+    def source(
+        self,
+        location: int,
+        writable: Tuple[bool, ...]
+    ) -> List[str]:
+        return [
+            f'machine.program_counter = {location}',
+            f'machine.write_memory_raw('
+            f'(registers[{self.rs1}].value + {self.n_int}) & 0xFFFFFFFF, '
+            f'registers[{self.rs2}])'
+        ]
+
     def assembly(self) -> str:
         return f'{self.mnemonic} x{self.rs2}, {self.n}(x{self.rs1})'
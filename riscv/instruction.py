@@ -1,36 +1,100 @@
+import functools
 import re
-from multimethod import multimethod
-from typing import List, Dict, Tuple
+import types
+from array import array
+from typing import List, Dict, Mapping, Optional, Tuple
 
 from riscv.machine import RiscMachine
 from riscv.data import RiscInteger
 
 
-class RiscInstructionException(BaseException):
+class RiscInstructionException(Exception):
     pass
 
 
-class RiscParseException(BaseException):
+class RiscParseException(Exception):
     pass
 
 
+# Most register names and immediates in a program are among these, so they
+# can be looked up as written; anything else is parsed the long way
+_REGISTERS = {f'x{i}': i for i in range(32)}
+_REGISTERS['zero'] = 0
+_SMALL_IMMEDIATES = {str(i): i & 0xFFFFFFFF for i in range(-2048, 2048)}
+
+
 class RiscInstruction:
+    __slots__ = ()
     INSTRUCTIONS = {}
 
-    @multimethod
-    def __init__(self, code: RiscInteger, *args, **kwargs): # noqa
-        if code[:7] != self.OPCODE:
+    # For each mnemonic, the bound methods needed to parse its arguments
+    _PARSERS = {}
+
+    # Implementations by opcode and funct3, for decoding
+    _DECODERS = {}
+
+    # Instructions that may transfer control elsewhere end a basic block
+    ENDS_BLOCK = False
+
+    def __init__(self, *args, **kwargs):
+        # Instructions are built from their encoding or from their fields;
+        # from_code() and from_fields() do the same without the type check
+        if args and isinstance(args[0], RiscInteger):
+            self.check_opcode(args[0])
+            self.decode(*args, **kwargs)
+        else:
+            self.initialize(*args, **kwargs)
+
+    @classmethod
+    def from_code(
+        cls,
+        code: RiscInteger,
+        *args,
+        **kwargs
+    ) -> 'RiscInstruction':
+        instruction = cls.__new__(cls)
+        instruction.check_opcode(code)
+        instruction.decode(code, *args, **kwargs)
+        return instruction
+
+    @classmethod
+    def from_fields(cls, *args, **kwargs) -> 'RiscInstruction':
+        instruction = cls.__new__(cls)
+        instruction.initialize(*args, **kwargs)
+        return instruction
+
+    @classmethod
+    def from_parts(
+        cls,
+        parts: Tuple[str, ...],
+        locations: Dict[str, int],
+        location: int
+    ) -> 'RiscInstruction':
+        instruction = cls.__new__(cls)
+        instruction.parse_args(parts, locations, location)
+        return instruction
+
+    def check_opcode(self, code: RiscInteger) -> None:
+        if code.value & 0x7F != self.OPCODE:
             raise RiscInstructionException('Wrong opcode')
 
-        self.decode(code, *args, **kwargs)
+    @classmethod
+    def matches(cls, word: int) -> bool:
+        return word & 0x7F == cls.OPCODE and word >> 12 & 0x7 == cls.FUNCT3
 
-    @multimethod
-    def __init__(self, parts: Tuple[str, str, str], *args): # noqa
-        return self.parse_args(parts, *args)
+    @classmethod
+    def try_decode(
+        cls,
+        code: RiscInteger,
+        *args,
+        **kwargs
+    ) -> Optional['RiscInstruction']:
+        # Like from_code(), but returns None rather than raising when the
+        # code belongs to another instruction
+        if not cls.matches(code.value):
+            return None
 
-    @multimethod
-    def __init__(self, *args, **kwargs): # noqa
-        return self.initialize(*args, **kwargs)
+        return cls.from_code(code, *args, **kwargs)
 
     def parse_args(self, parts, *args):
         raise NotImplementedError
@@ -38,32 +102,79 @@ class RiscInstruction:
     def run(self, machine: RiscMachine) -> None:
         raise NotImplementedError
 
+    def registers_in_range(self) -> bool:
+        return all(0 <= r < 32 for r in self.register_operands())
+
+    def register_operands(self) -> Tuple[int, ...]:
+        raise NotImplementedError
+
+    def fields(self) -> tuple:
+        # The arguments from_fields() takes to build this instruction
+        raise NotImplementedError
+
+    def source(
+        self,
+        location: int,
+        writable: Tuple[bool, ...]
+    ) -> Optional[List[str]]:
+        # Python statements that execute this instruction at the given
+        # location, with the machine and its registers in scope as "machine"
+        # and "registers"; instructions that end a block must also set the
+        # program counter. Returning None means run() is used instead.
+        return None
+
+    @staticmethod
+    def write_source(
+        index: int,
+        value: str,
+        writable: Tuple[bool, ...]
+    ) -> str:
+        # Registers known to be writable are stored to directly; others are
+        # left to the machine, which keeps track of protected writes
+        if writable[index]:
+            return f'registers[{index}] = {value}'
+
+        return f'machine.write_register({index}, {value})'
+
     def assembly(self) -> str:
         raise NotImplementedError
 
     def decode(self, code: RiscInteger, *args, **kwargs):
         raise NotImplementedError
 
-    def encode(self) -> RiscInteger:
+    def encode_int(self) -> int:
         raise NotImplementedError
 
+    def encode(self, *args, **kwargs) -> RiscInteger:
+        return RiscInteger.from_word(self.encode_int(*args, **kwargs))
+
+    @staticmethod
+    def encode_all(instructions: List['RiscInstruction']) -> array:
+        # One unsigned 32-bit word per instruction, ready for tobytes()
+        return array('I', [i.encode_int() for i in instructions])
+
     def __str__(self) -> str:
         return f'<{self.__class__.__name__} "{self.assembly()}">'
 
     @staticmethod
     def parse_register(name: str) -> int:
-        if name[0] == 'x':
+        register = _REGISTERS.get(name)
+        if register is not None:
+            return register
+        elif name[0] == 'x':
             try:
                 return int(name[1:])
             except ValueError:
                 raise RiscParseException(f'Unknown register name: "{name}"')
-        elif name == 'zero':
-            return 0
         else:
             raise RiscParseException('Register names should start with "x"')
 
     @staticmethod
     def parse_immediate(immediate: str) -> RiscInteger:
+        word = _SMALL_IMMEDIATES.get(immediate)
+        if word is not None:
+            return RiscInteger.from_word(word)
+
         try:
             return RiscInteger(int(immediate))
         except ValueError:
@@ -76,75 +187,136 @@ class RiscInstruction:
         def wrapper(impl):
             cls.INSTRUCTIONS[name] = impl
             impl.mnemonic = name
+            impl._FORMAT_RE = re.compile(impl.FORMAT)
+            cls._PARSERS[name] = (impl._FORMAT_RE.match, impl.from_parts)
+            cls._DECODERS[impl.OPCODE, impl.FUNCT3] = impl
             return impl
         return wrapper
 
     @classmethod
-    def parse_line(
+    def decode_word(cls, word: int) -> 'RiscInstruction':
+        # Only the decoded fields are memoized, since instructions may be
+        # modified; every call gets its own instruction and immediate
+        impl, fields, immediate = cls.decode_fields(word)
+        if immediate is None:
+            return impl.from_fields(*fields)
+
+        return impl.from_fields(*fields, RiscInteger.from_word(immediate))
+
+    @classmethod
+    @functools.lru_cache(maxsize=65536)
+    def decode_fields(
         cls,
-        line: str,
-        locations: Dict[str, RiscInteger],
-        location: RiscInteger
-    ) -> 'RiscInstruction':
-        if not line.strip():
-            return None
+        word: int
+    ) -> Tuple[type, tuple, Optional[int]]:
+        # Immediates come last in the fields, and are kept as a raw word
+        impl = cls._DECODERS.get((word & 0x7F, word >> 12 & 0x7))
+        if impl is None:
+            raise RiscInstructionException(
+                f'Unknown instruction word 0x{word:08X}'
+            )
 
-        locations = locations or {}
+        fields = impl.from_code(RiscInteger(word, signed=False)).fields()
+        if isinstance(fields[-1], RiscInteger):
+            return impl, fields[:-1], fields[-1].value
 
+        return impl, fields, None
+
+    @staticmethod
+    def split_line(line: str) -> Tuple[str, str]:
         try:
-            instr, args = line.strip().split(' ', 1)
+            instr, args = line.split(' ', 1)
         except ValueError:
             raise RiscParseException(f'Could not parse line "{line}"')
 
-        instr = instr.lower()
-        if instr not in RiscInstruction.INSTRUCTIONS:
+        return instr.lower(), args.strip()
+
+    @classmethod
+    def parse_instruction(
+        cls,
+        instr: str,
+        args: str,
+        locations: Dict[str, int],
+        location: int
+    ) -> 'RiscInstruction':
+        try:
+            match, from_parts = cls._PARSERS[instr]
+        except KeyError:
             raise RiscParseException(f'Unknown instruction "{instr}"')
 
-        impl = cls.INSTRUCTIONS[instr]
-        match = re.match(impl.FORMAT, args.strip())
+        match = match(args)
         if match is None:
-            raise RiscParseException(f'Could not parse instruction "{line}"')
+            raise RiscParseException(
+                f'Could not parse instruction "{instr} {args}"'
+            )
+
+        return from_parts(match.groups(), locations, location)
+
+    @classmethod
+    def parse_line(
+        cls,
+        line: str,
+        locations: Dict[str, int],
+        location: int
+    ) -> 'RiscInstruction':
+        line = line.strip()
+        if not line:
+            return None
 
-        return impl(match.groups(), locations, location)
+        instr, args = cls.split_line(line)
+        return cls.parse_instruction(instr, args, locations or {}, location)
 
     @classmethod
     def parse(cls, lines: List[str]) -> List['RiscInstruction']:
+        # Only the split into mnemonics and arguments is shared between
+        # programs with the same source; callers may modify instructions, so
+        # each call builds its own
+        parts, locations = cls.split_program(tuple(lines))
+        return [
+            cls.parse_instruction(instr, args, locations, i * 4)
+            for i, (instr, args) in enumerate(parts)
+        ]
+
+    @classmethod
+    @functools.lru_cache
+    def split_program(
+        cls,
+        lines: Tuple[str, ...]
+    ) -> Tuple[Tuple[Tuple[str, str], ...], Mapping[str, int]]:
         lines_without_labels = []
         locations = {}
         offset = 0
         for line in lines:
-            # Remove comments started with "#", "//", or ";"
-            match = re.match('([^;#/]*)(([;#]|//).*)?', line)
-            line = match.group(1).strip()
+            # Remove comments started with "#", "//", or ";"; like before,
+            # anything from a single "/" onwards is dropped as well
+            for marker in ';#/':
+                index = line.find(marker)
+                if index >= 0:
+                    line = line[:index]
+
+            line = line.strip()
 
             # Ignore empty lines
             if not line:
                 continue
 
-            if re.match('^[a-zA-Z_][a-zA-Z_0-9]*:$', line):
+            # Labels are an ASCII identifier followed by a colon
+            if line[-1] == ':' and line.isascii() and \
+               line[:-1].isidentifier():
                 # If it is a label, store it at the current offset
-                locations[line[:-1]] = RiscInteger(offset)
+                locations[line[:-1]] = offset
             else:
-                # Otherwise, remember the line and increment the offset
-                lines_without_labels.append(line)
+                # Otherwise, split off the mnemonic and increment the offset
+                lines_without_labels.append(cls.split_line(line))
                 offset += 4
 
-        instructions = []
-        for i, line in enumerate(lines_without_labels):
-            instruction = RiscInstruction.parse_line(
-                line,
-                locations,
-                RiscInteger(i * 4)
-            )
-            if not instruction:
-                continue
-
-            instructions.append(instruction)
-
-        return instructions
+        # The result is shared by every parse of these lines, so it is
+        # returned read-only
+        return tuple(lines_without_labels), types.MappingProxyType(locations)
 
 
 class RTypeRiscInstruction(RiscInstruction):
+    __slots__ = ('rd', 'rs1', 'rs2')
     FORMAT = r'([a-z0-9]+),\s*([a-z0-9]+),\s*([a-z0-9]+)'
 
     def initialize(self, rd: int, rs1: int, rs2: int):
@@ -152,16 +324,27 @@ class RTypeRiscInstruction(RiscInstruction):
         self.rs1 = rs1
         self.rs2 = rs2
 
+    def register_operands(self) -> Tuple[int, ...]:
+        return self.rd, self.rs1, self.rs2
+
+    def fields(self) -> tuple:
+        return self.rd, self.rs1, self.rs2
+
+    @classmethod
+    def matches(cls, word: int) -> bool:
+        return super().matches(word) and word >> 25 == cls.FUNCT7
+
     def decode(self, code: RiscInteger): # noqa
-        self.rd = code[7:12]
+        word = code.value
+        self.rd = word >> 7 & 0x1F
 
-        if code[12:15] != self.FUNCT3:
+        if word >> 12 & 0x7 != self.FUNCT3:
             raise RiscInstructionException('Wrong funct3')
 
-        self.rs1 = code[15:20]
-        self.rs2 = code[20:25]
+        self.rs1 = word >> 15 & 0x1F
+        self.rs2 = word >> 20 & 0x1F
 
-        if code[25:] != self.FUNCT7:
+        if word >> 25 != self.FUNCT7:
             raise RiscInstructionException('Wrong funct7')
 
     def parse_args(self, parts: Tuple[str, str, str], *args): # noqa
@@ -172,36 +355,53 @@ class RTypeRiscInstruction(RiscInstruction):
     def assembly(self) -> str:
         return f'{self.mnemonic} x{self.rd}, x{self.rs1}, x{self.rs2}'
 
-    def encode(self) -> RiscInteger:
-        return RiscInteger([
-            (self.OPCODE, 7),
-            (self.rd, 5),
-            (self.FUNCT3, 3),
-            (self.rs1, 5),
-            (self.rs2, 5),
-            (self.FUNCT7, 7),
-        ])
+    def encode_int(self) -> int:
+        return (
+            self.OPCODE |
+            (self.rd & 0x1F) << 7 |
+            self.FUNCT3 << 12 |
+            (self.rs1 & 0x1F) << 15 |
+            (self.rs2 & 0x1F) << 20 |
+            self.FUNCT7 << 25
+        )
 
 
 class ITypeRiscInstruction(RiscInstruction):
+    __slots__ = ('rd', 'rs1', '_n', 'n_int')
     FORMAT = r'([a-z0-9]+),\s*([a-z0-9]+),\s*(-?[0-9]+)'
 
+    @property
+    def n(self) -> RiscInteger:
+        return self._n
+
+    @n.setter
+    def n(self, n: RiscInteger) -> None:
+        # Keep the signed value used when running in step with the field
+        self._n = n
+        self.n_int = n.to_int()
+
     def initialize(self, rd: int, rs1: int, n: RiscInteger):
         self.rd = rd
         self.rs1 = rs1
         self.n = n
 
+    def register_operands(self) -> Tuple[int, ...]:
+        return self.rd, self.rs1
+
+    def fields(self) -> tuple:
+        return self.rd, self.rs1, self.n
+
     def decode(self, code: RiscInteger): # noqa
-        self.rd = code[7:12]
+        word = code.value
+        self.rd = word >> 7 & 0x1F
 
-        if code[12:15] != self.FUNCT3:
+        if word >> 12 & 0x7 != self.FUNCT3:
             raise RiscInstructionException('Wrong funct3')
 
-        self.rs1 = code[15:20]
-        self.n = RiscInteger([
-            code.bits[20:],
-            code.bits[31:32] * 20
-        ])
+        self.rs1 = word >> 15 & 0x1F
+
+        # Sign-extend the 12-bit immediate
+        self.n = RiscInteger(((word >> 20) ^ 0x800) - 0x800)
 
     def parse_args(self, parts: Tuple[str, str, str], *args): # noqa
         self.rd = RiscInstruction.parse_register(parts[0])
@@ -211,119 +411,166 @@ class ITypeRiscInstruction(RiscInstruction):
     def assembly(self) -> str:
         return f'{self.mnemonic} x{self.rd}, x{self.rs1}, {self.n}'
 
-    def encode(self) -> RiscInteger:
-        return RiscInteger([
-            (self.OPCODE, 7),
-            (self.rd, 5),
-            (self.FUNCT3, 3),
-            (self.rs1, 5),
-            (self.n, 12),
-        ])
+    def encode_int(self) -> int:
+        return (
+            self.OPCODE |
+            (self.rd & 0x1F) << 7 |
+            self.FUNCT3 << 12 |
+            (self.rs1 & 0x1F) << 15 |
+            (self.n.value & 0xFFF) << 20
+        )
 
 
 class SBTypeRiscInstruction(RiscInstruction):
+    __slots__ = ('rs1', 'rs2', '_offset', 'offset_int')
+    ENDS_BLOCK = True
     FORMAT = r'([a-z0-9]+),\s*([a-z0-9]+),\s*([a-zA-Z_][a-zA-Z_0-9]*|-?[0-9]+)'
 
+    @property
+    def offset(self) -> RiscInteger:
+        return self._offset
+
+    @offset.setter
+    def offset(self, offset: RiscInteger) -> None:
+        self._offset = offset
+        self.offset_int = offset.to_int()
+
     def initialize(self, rs1: int, rs2: int, offset: RiscInteger):
         self.rs1 = rs1
         self.rs2 = rs2
         self.offset = offset
 
+    def register_operands(self) -> Tuple[int, ...]:
+        return self.rs1, self.rs2
+
+    def fields(self) -> tuple:
+        return self.rs1, self.rs2, self.offset
+
     def decode(self, code: RiscInteger, swirl=True): # noqa
+        # Both layouts hold bits 1 to 12 of the offset, which are gathered
+        # and then sign-extended from bit 12; this undoes encode_int()
+        word = code.value
         if swirl:
-            self.offset = RiscInteger([
-                [False],
-                code.bits[8:12],
-                code.bits[25:31],
-                code.bits[7:8],
-                code.bits[31:] * 20,
-            ])
+            offset = (
+                (word >> 7 & 0x1E) |
+                (word >> 20 & 0x7E0) |
+                (word << 4 & 0x800) |
+                (word >> 19 & 0x1000)
+            )
         else:
-            self.offset = RiscInteger([
-                code[7:12],
-                code[25:],
-                code[31:] * 20
-            ])
+            offset = (word >> 7 & 0x1F) << 1 | (word >> 25) << 6
 
-        if code[12:15] != self.FUNCT3:
+        self.offset = RiscInteger((offset ^ 0x1000) - 0x1000)
+
+        if word >> 12 & 0x7 != self.FUNCT3:
             raise RiscInstructionException('Wrong funct3')
 
-        self.rs1 = code[15:20]
-        self.rs2 = code[20:25]
+        self.rs1 = word >> 15 & 0x1F
+        self.rs2 = word >> 20 & 0x1F
 
     def parse_args( # noqa
         self,
         parts: Tuple[str, str, str],
-        locations: Dict[str, RiscInteger],
-        location: RiscInteger,
+        locations: Dict[str, int],
+        location: int,
         *args
     ):
         self.rs1 = RiscInstruction.parse_register(parts[0])
         self.rs2 = RiscInstruction.parse_register(parts[1])
 
-        try:
+        # Labels cannot start like a number, so there is no need to try
+        # parsing the offset as an immediate first
+        if parts[2][0] == '-' or parts[2][0].isdigit():
             self.offset = RiscInstruction.parse_immediate(parts[2])
-        except RiscParseException:
-            try:
-                self.offset = locations[parts[2]] - location
-            except KeyError:
-                raise RiscParseException(
-                    f'Unable to resolve location "{parts[2]}"'
-                )
+            return
+
+        try:
+            target = locations[parts[2]]
+        except KeyError:
+            raise RiscParseException(
+                f'Unable to resolve location "{parts[2]}"'
+            )
+
+        # parse() resolves labels to ints; other callers of parse_line()
+        # may still pass labels and the location as RiscIntegers
+        if isinstance(target, RiscInteger):
+            target = target.to_int()
+        if isinstance(location, RiscInteger):
+            location = location.to_int()
+
+        self.offset = RiscInteger(target - location)
 
     def assembly(self) -> str:
         return f'{self.mnemonic} x{self.rs1}, x{self.rs2}, {self.offset}'
 
-    def encode(self, swirl=True) -> RiscInteger:
+    def encode_int(self, swirl=True) -> int:
+        offset = self.offset.value
         if swirl:
-            return RiscInteger([
-                (self.OPCODE, 7),
-                self.offset.bits[11:12],
-                self.offset.bits[1:5],
-                (self.FUNCT3, 3),
-                (self.rs1, 5),
-                (self.rs2, 5),
-                self.offset.bits[5:11],
-                self.offset.bits[12:13],
-            ])
+            # Each group of offset bits is moved into place with one mask
+            # and one shift, mirroring decode()
+            return (
+                self.OPCODE |
+                (offset & 0x800) >> 4 |
+                (offset & 0x1E) << 7 |
+                self.FUNCT3 << 12 |
+                (self.rs1 & 0x1F) << 15 |
+                (self.rs2 & 0x1F) << 20 |
+                (offset & 0x7E0) << 20 |
+                (offset & 0x1000) << 19
+            )
         else:
-            return RiscInteger([
-                (0b1100011, 7),
-                self.offset.bits[1:6],
-                (self.FUNCT3, 3),
-                (self.rs1, 5),
-                (self.rs2, 5),
-                self.offset.bits[6:13],
-            ])
+            return (
+                0b1100011 |
+                (offset >> 1 & 0x1F) << 7 |
+                self.FUNCT3 << 12 |
+                (self.rs1 & 0x1F) << 15 |
+                (self.rs2 & 0x1F) << 20 |
+                (offset >> 6 & 0x7F) << 25
+            )
 
 
 class STypeRiscInstruction(RiscInstruction):
+    __slots__ = ('rs1', 'rs2', '_n', 'n_int')
     FORMAT = r'([a-z0-9]+),\s*(-?[0-9]+)\(([a-z0-9]+)\)'
 
+    @property
+    def n(self) -> RiscInteger:
+        return self._n
+
+    @n.setter
+    def n(self, n: RiscInteger) -> None:
+        self._n = n
+        self.n_int = n.to_int()
+
     def initialize(self, rs1: int, rs2: int, n: RiscInteger):
         self.rs1 = rs1
         self.rs2 = rs2
         self.n = n
 
+    def register_operands(self) -> Tuple[int, ...]:
+        return self.rs1, self.rs2
+
+    def fields(self) -> tuple:
+        return self.rs1, self.rs2, self.n
+
     def decode(self, code: RiscInteger, swirl=True): # noqa
-        self.n = RiscInteger([
-            code.bits[7:12],
-            code.bits[25:],
-            code.bits[31:] * 20
-        ])
+        # Sign-extend the 12-bit immediate, split over two fields
+        word = code.value
+        n = word >> 7 & 0x1F | word >> 20 & 0xFE0
+        self.n = RiscInteger((n ^ 0x800) - 0x800)
 
-        if code[12:15] != self.FUNCT3:
+        if word >> 12 & 0x7 != self.FUNCT3:
             raise RiscInstructionException('Wrong funct3')
 
-        self.rs1 = code[15:20]
-        self.rs2 = code[20:25]
-
-    def encode(self) -> RiscInteger:
-        return RiscInteger([
-            (self.OPCODE, 7),
-            self.n.bits[0:5],
-            (self.FUNCT3, 3),
-            (self.rs1, 5),
-            (self.rs2, 5),
-            self.n.bits[5:12],
-        ])
+        self.rs1 = word >> 15 & 0x1F
+        self.rs2 = word >> 20 & 0x1F
+
+    def encode_int(self) -> int:
+        return (
+            self.OPCODE |
+            (self.n.value & 0x1F) << 7 |
+            self.FUNCT3 << 12 |
+            (self.rs1 & 0x1F) << 15 |
+            (self.rs2 & 0x1F) << 20 |
+            (self.n.value >> 5 & 0x7F) << 25
+        )
@@ -0,0 +1,192 @@
+import functools
+from typing import List, Tuple
+
+from riscv.data import RiscInteger
+from riscv.implementation.arithmetic import \
+    AddRiscInstruction, AddImmediateRiscInstruction
+from riscv.implementation.branch import \
+    BranchEqualRiscInstruction, BranchGreaterEqualRiscInstruction, \
+    BranchLessThanRiscInstruction
+from riscv.implementation.memory import \
+    LoadWordRiscInstruction, StoreWordRiscInstruction
+from riscv.instruction import RiscInstruction
+from riscv.machine import RiscMachine
+
+try:
+    import numba
+    import numpy
+except ImportError:
+    numba = None
+
+
+# Numba is an optional dependency; without it, simulate() does nothing and
+# the simulator falls back to executing instructions in Python.
+ENABLED = numba is not None
+
+# Opcodes are numbered, and tested in execute(), roughly in order of how
+# often they are executed in typical programs.
+OP_ADDI = 0
+OP_LW = 1
+OP_SW = 2
+OP_ADD = 3
+OP_BLT = 4
+OP_BGE = 5
+OP_BEQ = 6
+
+OPCODES = {
+    AddImmediateRiscInstruction: OP_ADDI,
+    LoadWordRiscInstruction: OP_LW,
+    StoreWordRiscInstruction: OP_SW,
+    AddRiscInstruction: OP_ADD,
+    BranchLessThanRiscInstruction: OP_BLT,
+    BranchGreaterEqualRiscInstruction: OP_BGE,
+    BranchEqualRiscInstruction: OP_BEQ,
+}
+
+
+def lower(instructions: List[RiscInstruction]):
+    # Each instruction becomes an opcode, plus a row of operands holding
+    # (rd, rs1, rs2, immediate); unused operands are left at zero.
+    rows = []
+    for instruction in instructions:
+        opcode = OPCODES.get(type(instruction))
+        if opcode is None:
+            return None
+
+        if opcode == OP_ADDI or opcode == OP_LW:
+            fields = (instruction.rd, instruction.rs1, 0, instruction.n_int)
+        elif opcode == OP_SW:
+            fields = (0, instruction.rs1, instruction.rs2, instruction.n_int)
+        elif opcode == OP_ADD:
+            fields = (instruction.rd, instruction.rs1, instruction.rs2, 0)
+        else:
+            fields = (0, instruction.rs1, instruction.rs2,
+                      instruction.offset_int)
+
+        # Leave out-of-range registers to the machine to complain about
+        if not instruction.registers_in_range():
+            return None
+
+        rows.append((opcode, fields))
+
+    return lower_rows(tuple(rows))
+
+
+@functools.lru_cache(maxsize=256)
+def lower_rows(rows: Tuple[Tuple[int, Tuple[int, ...]], ...]):
+    # The arrays are cached by their contents, so programs with the same
+    # operands (e.g., parsed from the same source) share them; execute()
+    # does not write to them.
+    opcodes = numpy.array([opcode for opcode, _ in rows], dtype=numpy.int8)
+    operands = numpy.array(
+        [fields for _, fields in rows], dtype=numpy.int64
+    ).reshape(len(rows), 4)
+    return opcodes, operands
+
+
+def execute(opcodes, operands, registers, writable, written, memory, pc):
+    # Runs until the program counter leaves the program, or until an
+    # instruction needs the slow path (e.g., to raise an exception), and
+    # returns the program counter at which execution stopped.
+    end = len(opcodes) * 4
+    while 0 <= pc < end:
+        index = pc >> 2
+        op = opcodes[index]
+        rd = operands[index, 0]
+        rs1 = operands[index, 1]
+        rs2 = operands[index, 2]
+        immediate = operands[index, 3]
+
+        if op == OP_ADDI:
+            value = (registers[rs1] + immediate) & 0xFFFFFFFF
+        elif op == OP_LW or op == OP_SW:
+            address = (registers[rs1] + immediate) & 0xFFFFFFFF
+            if address & 3:
+                return pc
+
+            # Memory is keyed by the signed interpretation of the address
+            address = (address ^ 0x80000000) - 0x80000000
+            if op == OP_SW:
+                memory[address] = registers[rs2]
+                pc += 4
+                continue
+            elif address not in memory:
+                return pc
+
+            value = memory[address]
+        elif op == OP_ADD:
+            value = (registers[rs1] + registers[rs2]) & 0xFFFFFFFF
+        else:
+            if op == OP_BEQ:
+                taken = registers[rs1] == registers[rs2]
+            else:
+                a = (registers[rs1] ^ 0x80000000) - 0x80000000
+                b = (registers[rs2] ^ 0x80000000) - 0x80000000
+                taken = a < b if op == OP_BLT else a >= b
+
+            pc += immediate if taken else 4
+            continue
+
+        if writable[rd]:
+            registers[rd] = value
+        else:
+            written[rd] = True
+
+        pc += 4
+
+    return pc
+
+
+if ENABLED:
+    execute = numba.njit(cache=True)(execute)
+
+
+def simulate(machine: RiscMachine, instructions: List[RiscInstruction]):
+    # Executes as much of the program as possible in compiled code, and
+    # leaves the machine at the point where execution stopped.
+    simulate_batch([machine], instructions)
+
+
+def simulate_batch(
+    machines: List[RiscMachine],
+    instructions: List[RiscInstruction]
+):
+    # As simulate(), for each of the machines; the program is lowered once.
+    if not ENABLED:
+        return
+
+    lowered = lower(instructions)
+    if lowered is None:
+        return
+
+    for machine in machines:
+        run(machine, lowered)
+
+
+def run(machine: RiscMachine, lowered):
+    registers = numpy.array(
+        [register.value for register in machine.registers],
+        dtype=numpy.int64
+    )
+    writable = numpy.array(machine._writable)
+    written = numpy.zeros(32, dtype=numpy.bool_)
+    memory = numba.typed.Dict.empty(numba.int64, numba.int64)
+    for address, value in machine.memory.items():
+        memory[address] = value.value
+
+    machine.program_counter = execute(
+        *lowered,
+        registers,
+        writable,
+        written,
+        memory,
+        machine.program_counter
+    )
+
+    machine.registers[:] = [
+        RiscInteger(int(value), signed=False) for value in registers
+    ]
+    for address, value in memory.items():
+        machine.memory[address] = RiscInteger(value, signed=False)
+    machine.protected_registers_written |= \
+        {i for i in range(32) if written[i]}
@@ -2,22 +2,45 @@ from riscv.data import RiscInteger
 
 
 class RiscMachine:
+    __slots__ = (
+        'registers',
+        'program_counter',
+        'memory',
+        '_protected_registers',
+        '_writable',
+        'protected_registers_written',
+    )
+
     def __init__(self, memory: dict = None, protected_registers={0}):
-        self.registers = {i: RiscInteger(0) for i in range(32)}
+        # Registers are indexed by number; the explicit range checks below
+        # keep negative indices from wrapping around
+        self.registers = [RiscInteger(0) for _ in range(32)]
         self.program_counter = 0
         self.memory = memory or {}
         self.protected_registers = protected_registers
         self.protected_registers_written = set()
 
-    def write_register(self, index: int, value: int) -> None:
-        if index in self.protected_registers:
-            self.protected_registers_written |= {index}
-            return
+    @property
+    def protected_registers(self) -> frozenset:
+        return self._protected_registers
 
+    @protected_registers.setter
+    def protected_registers(self, registers: set) -> None:
+        # Writes look up whether a register is writable by index, rather
+        # than testing membership of the set every time; the set is frozen
+        # so that the two cannot get out of step
+        registers = frozenset(registers)
+        self._protected_registers = registers
+        self._writable = tuple(i not in registers for i in range(32))
+
+    def write_register(self, index: int, value: int) -> None:
         if index < 0 or index > 31:
             raise Exception('Write to unknown register')
 
-        self.registers[index] = value
+        if self._writable[index]:
+            self.registers[index] = value
+        else:
+            self.protected_registers_written.add(index)
 
     def read_register(self, index: int) -> int:
         if index < 0 or index > 31:
@@ -25,14 +48,36 @@ class RiscMachine:
 
         return self.registers[index]
 
+    def read_register_raw(self, index: int) -> int:
+        if index < 0 or index > 31:
+            raise Exception('Read from unknown register')
+
+        return self.registers[index].value
+
+    # Memory is a dict of words, keyed by their signed address
+
     def write_memory(self, address: int, value: int) -> None:
-        if address.bits[0:2] != [False, False]:
+        if address.value & 3:
             raise Exception('Unaligned memory write')
 
         self.memory[address.to_int()] = value
 
     def read_memory(self, address: int) -> int:
-        if address.bits[0:2] != [False, False]:
+        if address.value & 3:
             raise Exception('Unaligned memory read')
 
         return self.memory[address.to_int()]
+
+    # As above, but for an address given as an unsigned 32-bit int
+
+    def write_memory_raw(self, address: int, value: RiscInteger) -> None:
+        if address & 3:
+            raise Exception('Unaligned memory write')
+
+        self.memory[(address ^ 0x80000000) - 0x80000000] = value
+
+    def read_memory_raw(self, address: int) -> RiscInteger:
+        if address & 3:
+            raise Exception('Unaligned memory read')
+
+        return self.memory[(address ^ 0x80000000) - 0x80000000]
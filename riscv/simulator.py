@@ -1,23 +1,123 @@
-from multimethod import multimethod
-from typing import List
+import copy
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 
+from riscv import jit as riscv_jit
+from riscv.data import RiscInteger
 from riscv.instruction import RiscInstruction
 from riscv.machine import RiscMachine
 
 
 class RiscSimulator:
-    @multimethod
-    def __init__(self, instructions: List[RiscInstruction], **kwargs):
+    def __init__(
+        self,
+        instructions: Union[List[RiscInstruction], List[str]],
+        **kwargs
+    ):
+        # Programs given as source are parsed first
+        if all(isinstance(i, str) for i in instructions):
+            instructions = RiscInstruction.parse(instructions)
+
         self.machine = RiscMachine(**kwargs)
         self.instructions = instructions
 
-    @multimethod
-    def __init__(self, instructions: List[str], **kwargs): # noqa
-        self.machine = RiscMachine(**kwargs)
-        self.instructions = RiscInstruction.parse(instructions)
+    def compile_block(
+        self,
+        location: int,
+        writable: Tuple[bool, ...]
+    ) -> Callable[[RiscMachine], None]:
+        # Fuse the instructions from the given location up to the end of the
+        # basic block into a single function, so that executing the block
+        # takes one call rather than one per instruction; the function is
+        # only valid for machines with the given writable registers
+        lines = ['def block(machine):', '    registers = machine.registers']
+        start = location
+        end = len(self.instructions) * 4
+        while location < end:
+            index = location >> 2
+            instruction = self.instructions[index]
+            source = None
+            if instruction.registers_in_range():
+                source = instruction.source(location, writable)
+
+            if source is None:
+                # Leave the instruction to set the program counter itself,
+                # which means the block has to end here
+                lines.append(f'    machine.program_counter = {location}')
+                lines.append(f'    instructions[{index}].run(machine)')
+                break
+
+            lines.extend(f'    {line}' for line in source)
+            if instruction.ENDS_BLOCK:
+                break
+
+            location += 4
+        else:
+            lines.append(f'    machine.program_counter = {location}')
+
+        namespace = {
+            'RiscInteger': RiscInteger,
+            'instructions': self.instructions
+        }
+        exec(compile('\n'.join(lines), f'<block {start}>', 'exec'),
+             namespace)
+        return namespace['block']
+
+    def simulate(self, jit: bool = True) -> None:
+        if jit:
+            # Run in compiled code if possible; anything left over (e.g., an
+            # instruction that raises) is picked up by execute()
+            riscv_jit.simulate(self.machine, self.instructions)
+
+        self.execute(self.machine)
+
+    def simulate_batch(
+        self,
+        inputs: List[Dict[int, RiscInteger]],
+        jit: bool = True
+    ) -> List[RiscMachine]:
+        # Runs the program once for each input, starting from a copy of the
+        # machine with the given registers set, and returns the machines;
+        # the work of lowering and compiling the program is shared
+        machines = []
+        for registers in inputs:
+            machine = copy.deepcopy(self.machine)
+            for index, value in registers.items():
+                machine.registers[index] = value
+
+            machines.append(machine)
+
+        if jit:
+            riscv_jit.simulate_batch(machines, self.instructions)
+
+        blocks = {}
+        for machine in machines:
+            self.execute(machine, blocks)
+
+        return machines
+
+    def execute(
+        self,
+        machine: RiscMachine,
+        blocks: Optional[Dict[Tuple[bool, ...], Dict[int, Callable]]] = None
+    ) -> None:
+        # Blocks are compiled when first entered, and looked up by the
+        # location they start at; jumping into the middle of a block just
+        # compiles another one from there. Blocks have the instructions as
+        # they are now baked in, so they are only shared within one call,
+        # or between the machines of one batch that protect the same
+        # registers, since blocks write to registers directly.
+        writable = machine._writable
+        if blocks is None:
+            blocks = {}
+
+        blocks = blocks.setdefault(writable, {})
+        end = len(self.instructions) * 4
+        pc = machine.program_counter
+        while pc < end:
+            block = blocks.get(pc)
+            if block is None:
+                block = blocks[pc] = self.compile_block(pc, writable)
 
-    def simulate(self) -> None:
-        while self.machine.program_counter < len(self.instructions) * 4:
-            instruction = self.instructions[self.machine.program_counter >> 2]
-            instruction.run(self.machine)
+            block(machine)
+            pc = machine.program_counter
@@ -2,12 +2,253 @@ import pytest
 
 from riscv.data import RiscInteger
 from riscv.machine import RiscMachine
+from riscv.instruction import \
+    RiscInstruction, RiscInstructionException, RiscParseException
 from riscv.implementation.arithmetic import \
     AddRiscInstruction, AddImmediateRiscInstruction
 from riscv.implementation.branch import \
+    BranchEqualRiscInstruction, BranchGreaterEqualRiscInstruction, \
     BranchLessThanRiscInstruction
 from riscv.implementation.memory import \
     LoadWordRiscInstruction, StoreWordRiscInstruction
+from riscv.simulator import RiscSimulator
+
+
+class TestRiscInstruction:
+    def test_parse(self):
+        instructions = RiscInstruction.parse([
+            '  start:',
+            'add x1, x2, x3  # comment',
+            '',
+            '; only a comment',
+            'addi x4, x5, -6 // another comment',
+            'end:',
+            'blt x1, x4, start',
+        ])
+
+        assert [i.assembly() for i in instructions] == [
+            'add x1, x2, x3',
+            'addi x4, x5, -6',
+            'blt x1, x4, -8',
+        ]
+
+    def test_parse_load_word(self):
+        instruction, = RiscInstruction.parse(['lw x3, 8(x1)'])
+        assert instruction.assembly() == 'lw x3, 8(x1)'
+
+    @pytest.mark.parametrize('instruction, in_range', [
+        (AddRiscInstruction(3, 1, 2), True),
+        (AddRiscInstruction(3, 1, 40), False),
+        (BranchLessThanRiscInstruction(32, 0, RiscInteger(8)), False),
+    ])
+    def test_registers_in_range(self, instruction, in_range):
+        assert instruction.registers_in_range() == in_range
+
+    def test_parse_line(self):
+        blt = RiscInstruction.parse_line(
+            'blt x1, x2, loop',
+            {'loop': RiscInteger(4)},
+            16
+        )
+
+        assert blt.offset == RiscInteger(-12)
+        assert RiscInstruction.parse_line(
+            'blt x1, x2, loop',
+            {'loop': 4},
+            16
+        ).offset_int == -12
+        assert RiscInstruction.parse_line(
+            'blt x1, x2, loop',
+            {'loop': RiscInteger(4)},
+            RiscInteger(16)
+        ).offset_int == -12
+        assert RiscInstruction.parse_line('   ', {}, 0) is None
+
+    def test_encode_all(self):
+        instructions = RiscInstruction.parse([
+            'add x7, x10, x27',
+            'addi x8, x17, 1755',
+            'blt x11, x23, -2928',
+        ])
+        words = RiscInstruction.encode_all(instructions)
+
+        assert list(words) == [i.encode().value for i in instructions]
+        assert len(words.tobytes()) == 12
+
+    @pytest.mark.parametrize('line, fields', [
+        ('add x1, x2, x3', {'rd': 1, 'rs1': 2, 'rs2': 3}),
+        ('addi x1, x1, -1', {'rd': 1, 'rs1': 1, 'n_int': -1}),
+        ('lw x4, 8(x1)', {'rd': 4, 'rs1': 1, 'n_int': 8}),
+        ('sw x4, -12(x1)', {'rs1': 1, 'rs2': 4, 'n_int': -12}),
+        ('beq x1, x2, -16', {'rs1': 1, 'rs2': 2, 'offset_int': -16}),
+        ('bge x31, x2, 4094', {'rs1': 31, 'rs2': 2, 'offset_int': 4094}),
+        ('blt x1, x0, -4096', {'rs1': 1, 'rs2': 0, 'offset_int': -4096}),
+    ])
+    def test_decode_word(self, line, fields):
+        instruction, = RiscInstruction.parse([line])
+        word = instruction.encode_int()
+        decoded = RiscInstruction.decode_word(word)
+
+        assert type(decoded) is type(instruction)
+        assert {name: getattr(decoded, name) for name in fields} == fields
+        assert decoded.encode_int() == word
+
+        # Changing one decoded instruction does not affect the next
+        decoded.rs1 = 5
+        for name in ('n', 'offset'):
+            if hasattr(decoded, name):
+                getattr(decoded, name).value = 0
+
+        again = RiscInstruction.decode_word(word)
+        assert {name: getattr(again, name) for name in fields} == fields
+        assert again.encode_int() == word
+
+    def test_decode_word_unknown(self):
+        with pytest.raises(RiscInstructionException, match='Unknown'):
+            RiscInstruction.decode_word(0)
+
+    @pytest.mark.parametrize('line, field, value', [
+        ('addi x1, x2, -7', 'n_int', -7),
+        ('lw x1, -8(x2)', 'n_int', -8),
+        ('sw x1, 2044(x2)', 'n_int', 2044),
+        ('blt x1, x2, -4', 'offset_int', -4),
+    ])
+    def test_signed_fields(self, line, field, value):
+        parsed, = RiscInstruction.parse([line])
+        decoded = RiscInstruction.decode_word(parsed.encode().value)
+
+        assert getattr(parsed, field) == value
+        assert getattr(decoded, field) == value
+
+    def test_signed_fields_assigned(self):
+        addi = AddImmediateRiscInstruction(3, 1, RiscInteger(456))
+        addi.n = RiscInteger(-1)
+        blt = BranchLessThanRiscInstruction(1, 2, RiscInteger(8))
+        blt.offset = RiscInteger(-4)
+
+        machine = RiscMachine()
+        machine.registers[2] = RiscInteger(1)
+        machine.program_counter = 8
+        addi.run(machine)
+        blt.run(machine)
+
+        assert addi.assembly() == 'addi x3, x1, -1'
+        assert machine.registers[3] == RiscInteger(-1)
+        assert machine.program_counter == 8
+        assert blt.offset_int == -4
+
+    def test_try_decode(self):
+        add = AddRiscInstruction(7, 10, 27)
+
+        assert AddRiscInstruction.try_decode(add.encode()).rd == 7
+        assert AddImmediateRiscInstruction.try_decode(add.encode()) is None
+        assert AddRiscInstruction.try_decode(
+            RiscInteger(add.encode_int() | 1 << 30, signed=False)
+        ) is None
+        assert issubclass(RiscInstructionException, Exception)
+        assert issubclass(RiscParseException, Exception)
+
+    @pytest.mark.parametrize('name, register', [
+        ('x0', 0), ('x31', 31), ('zero', 0), ('x01', 1), ('x40', 40),
+    ])
+    def test_parse_register(self, name, register):
+        assert RiscInstruction.parse_register(name) == register
+
+    @pytest.mark.parametrize('immediate', ['0', '-2048', '2047', '4096'])
+    def test_parse_immediate(self, immediate):
+        assert RiscInstruction.parse_immediate(immediate) == \
+            RiscInteger(int(immediate))
+
+        # Each call gets its own value, so changing one leaves the next alone
+        RiscInstruction.parse_immediate(immediate).value = 1
+        assert RiscInstruction.parse_immediate(immediate).to_int() == \
+            int(immediate)
+
+    def test_parse_cached(self):
+        lines = ['loop:', 'addi x1, x1, 1', 'blt x1, x2, loop']
+        first = RiscInstruction.parse(lines)
+        first[0].rd = 7
+        second = RiscInstruction.parse(list(lines))
+
+        parts, locations = RiscInstruction.split_program(tuple(lines))
+        assert RiscInstruction.split_program(tuple(lines)) is \
+            RiscInstruction.split_program(tuple(lines))
+        assert parts == (('addi', 'x1, x1, 1'), ('blt', 'x1, x2, loop'))
+        with pytest.raises(TypeError):
+            locations['loop'] = 8
+        assert all(a is not b for a, b in zip(first, second))
+        assert second[0].rd == 1
+        assert second[1].offset_int == -4
+
+    @pytest.mark.parametrize('name', sorted(RiscInstruction.INSTRUCTIONS))
+    def test_format_compiled(self, name):
+        impl = RiscInstruction.INSTRUCTIONS[name]
+
+        assert impl._FORMAT_RE.pattern == impl.FORMAT
+        assert RiscInstruction._PARSERS[name] == \
+            (impl._FORMAT_RE.match, impl.from_parts)
+
+    @pytest.mark.parametrize('line', [
+        'add x1, x2, x3',
+        'addi x1, x2, 3',
+        'lw x1, 4(x2)',
+        'sw x1, 4(x2)',
+        'beq x1, x2, 8',
+        'bge x1, x2, 8',
+        'blt x1, x2, 8',
+    ])
+    def test_slots(self, line):
+        instruction, = RiscInstruction.parse([line])
+
+        assert not hasattr(instruction, '__dict__')
+        assert 'mnemonic' in type(instruction).__dict__
+
+    @pytest.mark.parametrize('line, message', [
+        ('nop', 'Could not parse line'),
+        ('mul x1, x2, x3', 'Unknown instruction'),
+        ('add x1, x2', 'Could not parse instruction'),
+        ('blt x1, x2, nowhere', 'Unable to resolve location'),
+    ])
+    def test_parse_errors(self, line, message):
+        with pytest.raises(RiscParseException, match=message):
+            RiscInstruction.parse([line])
+
+    @pytest.mark.parametrize('line', [
+        'add x3, x1, x2',
+        'addi x3, x1, -7',
+        'lw x3, 8(x1)',
+        'sw x2, -4(x1)',
+        'beq x1, x1, 12',
+        'bge x1, x2, 12',
+        'blt x1, x2, 12',
+    ])
+    def test_source(self, line):
+        def make_machine():
+            machine = RiscMachine()
+            machine.registers[1] = RiscInteger(100)
+            machine.registers[2] = RiscInteger(200)
+            machine.memory[108] = RiscInteger(42)
+            return machine
+
+        # The generated code for an instruction should agree with run()
+        s = RiscSimulator([line])
+        interpreted, compiled = make_machine(), make_machine()
+        s.instructions[0].run(interpreted)
+        s.compile_block(0, compiled._writable)(compiled)
+
+        assert interpreted.registers == compiled.registers
+        assert interpreted.memory == compiled.memory
+        assert interpreted.program_counter == compiled.program_counter
+
+    def test_constructors(self):
+        code = RiscInteger(0b1101101010000001110110011)
+        for instr in [AddRiscInstruction(code),
+                      AddRiscInstruction.from_code(code),
+                      AddRiscInstruction.from_fields(7, 10, 27)]:
+            assert (instr.rd, instr.rs1, instr.rs2) == (7, 10, 27)
+
+        with pytest.raises(RiscInstructionException, match='Wrong opcode'):
+            AddImmediateRiscInstruction.from_code(code)
 
 
 class TestAddRiscInstruction:
@@ -57,6 +298,52 @@ class TestAddImmediateRiscInstruction:
             RiscInteger(0b01101101101110001000010000010011)
 
 
+class TestBranchEqualRiscInstruction:
+    @pytest.mark.parametrize(
+        'rs1, rs2, jump',
+        [
+            (123, 456, False),
+            (123, 123, True),
+            (-1, -1, True),
+            (-1, 2**31-1, False),
+        ]
+    )
+    def test_run(self, rs1, rs2, jump):
+        machine = RiscMachine()
+        machine.registers[1] = RiscInteger(rs1)
+        machine.registers[2] = RiscInteger(rs2)
+        machine.program_counter = 220
+
+        beq = BranchEqualRiscInstruction(1, 2, RiscInteger(780))
+        beq.run(machine)
+
+        assert machine.program_counter == (1000 if jump else 224)
+
+
+class TestBranchGreaterEqualRiscInstruction:
+    @pytest.mark.parametrize(
+        'rs1, rs2, jump',
+        [
+            (123, 456, False),
+            (456, 123, True),
+            (123, 123, True),
+            (-1, 2, False),
+            (5, -5, True),
+            (-2**31, 2**31-1, False),
+        ]
+    )
+    def test_run(self, rs1, rs2, jump):
+        machine = RiscMachine()
+        machine.registers[1] = RiscInteger(rs1)
+        machine.registers[2] = RiscInteger(rs2)
+        machine.program_counter = 220
+
+        bge = BranchGreaterEqualRiscInstruction(1, 2, RiscInteger(-200))
+        bge.run(machine)
+
+        assert machine.program_counter == (20 if jump else 224)
+
+
 class TestBranchLessThanRiscInstruction:
     @pytest.mark.parametrize(
         'rs1, rs2, jump',
@@ -97,12 +384,23 @@ class TestBranchLessThanRiscInstruction:
         assert blt.rs1 == 11
         assert blt.rs2 == 23
         assert blt.offset == RiscInteger(-2928)
+        assert blt.offset_int == -2928
 
     def test_encode(self):
         blt = BranchLessThanRiscInstruction(11, 23, RiscInteger(-2928))
         assert blt.encode() == \
             RiscInteger(0b11001001011101011100100001100011, signed=False)
 
+    @pytest.mark.parametrize('swirl', [True, False])
+    @pytest.mark.parametrize('offset', [0, 2, -2, 2046, -2928, 4094, -4096])
+    def test_decode_encode(self, offset, swirl):
+        blt = BranchLessThanRiscInstruction(11, 23, RiscInteger(offset))
+        code = RiscInteger(blt.encode_int(swirl=swirl), signed=False)
+        decoded = BranchLessThanRiscInstruction(code, swirl=swirl)
+
+        assert (decoded.rs1, decoded.rs2) == (11, 23)
+        assert decoded.offset_int == offset
+
 
 class TestLoadWordRiscInstruction:
     @pytest.mark.parametrize(
@@ -129,6 +427,7 @@ class TestLoadWordRiscInstruction:
         assert lw.rd == 14
         assert lw.rs1 == 22
         assert lw.n == RiscInteger(-586)
+        assert lw.n_int == -586
 
     def test_encode(self):
         lw = LoadWordRiscInstruction(14, 22, RiscInteger(-586))
@@ -162,6 +461,7 @@ class TestStoreWordRiscInstruction:
         assert sw.rs1 == 29
         assert sw.rs2 == 19
         assert sw.n == RiscInteger(1365)
+        assert sw.n_int == 1365
 
     def test_encode(self):
         sw = StoreWordRiscInstruction(29, 19, RiscInteger(1365))
@@ -0,0 +1,98 @@
+import pytest
+
+from riscv import jit as riscv_jit
+from riscv.data import RiscInteger
+from riscv.instruction import RiscInstruction
+from riscv.simulator import RiscSimulator
+
+pytest.importorskip('numba')
+
+
+class TestJit:
+    @pytest.mark.parametrize('a, b', [(3, 5), (5, 3), (4, 4), (-7, 2)])
+    def test_matches_python(self, a, b):
+        program = [
+            'addi x10, x0, 256',
+            'beq x1, x2, equal',
+            'bge x1, x2, greater',
+            'blt x1, x2, less',
+            'equal:',
+            'addi x3, x0, 1',
+            'blt x0, x10, store',
+            'greater:',
+            'add x3, x1, x1',
+            'blt x0, x10, store',
+            'less:',
+            'add x3, x2, x2',
+            'store:',
+            'sw x3, -4(x10)',
+            'lw x4, -4(x10)',
+        ]
+
+        machines = []
+        for jit in (True, False):
+            s = RiscSimulator(program)
+            s.machine.registers[1] = RiscInteger(a)
+            s.machine.registers[2] = RiscInteger(b)
+            s.simulate(jit=jit)
+            machines.append(s.machine)
+
+        compiled, interpreted = machines
+        assert compiled.registers == interpreted.registers
+        assert compiled.memory == interpreted.memory
+        assert compiled.program_counter == interpreted.program_counter
+
+    def test_memory(self):
+        s = RiscSimulator([
+            'addi x1, x0, 64',
+            'lw x2, 0(x1)',
+            'addi x2, x2, 1',
+            'sw x2, 4(x1)',
+        ], memory={64: RiscInteger(41)})
+        s.simulate()
+
+        assert s.machine.memory[64] == RiscInteger(41)
+        assert s.machine.memory[68] == RiscInteger(42)
+        assert s.machine.program_counter == 16
+
+    def test_protected_register(self):
+        s = RiscSimulator(['addi x0, x0, 1', 'addi x1, x0, 2'])
+        s.simulate()
+
+        assert s.machine.registers[0] == RiscInteger(0)
+        assert s.machine.registers[1] == RiscInteger(2)
+        assert s.machine.protected_registers_written == {0}
+
+    @pytest.mark.parametrize('jit', [True, False])
+    def test_protected_registers_set(self, jit):
+        s = RiscSimulator(['addi x5, x0, 7', 'addi x6, x0, 7'])
+        s.machine.protected_registers = {0, 5}
+        s.simulate(jit=jit)
+
+        assert s.machine.registers[5] == RiscInteger(0)
+        assert s.machine.registers[6] == RiscInteger(7)
+        assert s.machine.protected_registers_written == {5}
+
+    def test_fallback(self):
+        # The unaligned load is left to the Python loop, which raises
+        s = RiscSimulator(['addi x1, x0, 7', 'lw x2, 0(x1)'])
+        with pytest.raises(Exception, match='Unaligned memory read'):
+            s.simulate()
+
+        assert s.machine.registers[1] == RiscInteger(7)
+        assert s.machine.program_counter == 4
+
+    def test_lower_cached(self):
+        lines = ['addi x1, x0, 1', 'add x2, x1, x1']
+        first = riscv_jit.lower(RiscInstruction.parse(lines))
+        second = riscv_jit.lower(RiscInstruction.parse(lines))
+
+        assert first is second
+        assert list(first[0]) == [riscv_jit.OP_ADDI, riscv_jit.OP_ADD]
+
+        # Changing an instruction changes the lowered program
+        instructions = RiscInstruction.parse(lines)
+        instructions[1].rs2 = 0
+        third = riscv_jit.lower(instructions)
+        assert third is not first
+        assert list(third[1][1]) == [2, 1, 0, 0]
@@ -0,0 +1,105 @@
+import copy
+
+import pytest
+
+from riscv.data import RiscInteger
+from riscv.machine import RiscMachine
+
+
+class TestRiscMachine:
+    @pytest.mark.parametrize('value', [0, 123, -1, -2**31])
+    def test_read_register_raw(self, value):
+        machine = RiscMachine()
+        machine.registers[5] = RiscInteger(value)
+
+        assert machine.read_register_raw(5) == RiscInteger(value).value
+
+    @pytest.mark.parametrize('index', [-1, 32])
+    def test_read_register_range(self, index):
+        machine = RiscMachine()
+        with pytest.raises(Exception, match='unknown register'):
+            machine.read_register_raw(index)
+
+    @pytest.mark.parametrize('index', [-1, 32])
+    def test_write_register_range(self, index):
+        machine = RiscMachine()
+        with pytest.raises(Exception, match='unknown register'):
+            machine.write_register(index, RiscInteger(1))
+
+        assert machine.registers == [RiscInteger(0)] * 32
+
+    @pytest.mark.parametrize('address', [1, 2, 3, -1, -3])
+    def test_memory_unaligned(self, address):
+        machine = RiscMachine()
+        with pytest.raises(Exception, match='Unaligned memory write'):
+            machine.write_memory(RiscInteger(address), RiscInteger(1))
+        with pytest.raises(Exception, match='Unaligned memory read'):
+            machine.read_memory(RiscInteger(address))
+
+    @pytest.mark.parametrize('address', [0, 4, -4, -2**31])
+    def test_memory(self, address):
+        machine = RiscMachine()
+        machine.write_memory(RiscInteger(address), RiscInteger(7))
+
+        assert machine.memory == {address: RiscInteger(7)}
+        assert machine.read_memory(RiscInteger(address)) == RiscInteger(7)
+
+    @pytest.mark.parametrize('address', [0, 4, -4, -2**31])
+    def test_memory_raw(self, address):
+        machine = RiscMachine()
+        raw = RiscInteger(address).value
+        machine.write_memory_raw(raw, RiscInteger(7))
+
+        assert machine.memory == {address: RiscInteger(7)}
+        assert machine.read_memory_raw(raw) == RiscInteger(7)
+        assert machine.read_memory(RiscInteger(address)) == RiscInteger(7)
+
+        with pytest.raises(Exception, match='Unaligned memory read'):
+            machine.read_memory_raw(raw + 2)
+
+    def test_protected_registers(self):
+        machine = RiscMachine(protected_registers={0, 5})
+        machine.write_register(0, RiscInteger(1))
+        machine.write_register(5, RiscInteger(1))
+        machine.write_register(6, RiscInteger(1))
+
+        assert machine.read_register(0) == RiscInteger(0)
+        assert machine.read_register(5) == RiscInteger(0)
+        assert machine.read_register(6) == RiscInteger(1)
+        assert machine.protected_registers_written == {0, 5}
+
+        machine.protected_registers = set()
+        machine.write_register(0, RiscInteger(2))
+        assert machine.read_register(0) == RiscInteger(2)
+
+    def test_protected_registers_frozen(self):
+        registers = {0}
+        machine = RiscMachine(protected_registers=registers)
+        registers.add(5)
+        machine.write_register(5, RiscInteger(1))
+
+        assert machine.read_register(5) == RiscInteger(1)
+        with pytest.raises(AttributeError):
+            machine.protected_registers.add(5)
+
+    def test_registers_distinct(self):
+        machine = RiscMachine()
+        machine.registers[1].value = 5
+
+        assert machine.read_register(2) == RiscInteger(0)
+
+    def test_deepcopy(self):
+        machine = RiscMachine(protected_registers={0, 5})
+        machine.write_register(1, RiscInteger(3))
+        machine.write_register(5, RiscInteger(3))
+        machine.write_memory(RiscInteger(4), RiscInteger(7))
+
+        clone = copy.deepcopy(machine)
+        clone.write_register(1, RiscInteger(4))
+        clone.write_memory(RiscInteger(4), RiscInteger(8))
+
+        assert machine.read_register(1) == RiscInteger(3)
+        assert machine.read_memory(RiscInteger(4)) == RiscInteger(7)
+        assert clone.protected_registers == {0, 5}
+        assert clone.protected_registers_written == {5}
+        assert not hasattr(machine, '__dict__')
@@ -39,6 +39,13 @@ class TestRiscInteger:
         with pytest.raises(RiscIntegerException):
             RiscInteger(number, signed=signed)
 
+    @pytest.mark.parametrize('value', ['123', 1.5, None, (1, 2)])
+    def test_constructor_types(self, value):
+        with pytest.raises(RiscIntegerException) as exc:
+            RiscInteger(value)
+
+        assert 'Cannot construct' in str(exc)
+
     @pytest.mark.parametrize('pattern, bits, pad', [
         ([True]*32, [True]*32, None),
         ([False]*32, [False]*32, None),
@@ -50,6 +57,7 @@ class TestRiscInteger:
              False, True, False],
             False,
         ),
+        ([(1, True), (0b10, 2)] + [True]*29, [True, False, True], True),
     ])
     def test_constructor_bits(self, pattern, bits, pad):
         integer = RiscInteger(pattern)
@@ -63,6 +71,7 @@ class TestRiscInteger:
         [(123, 456, 789)],
         [[False, 'test']],
         [(0b0, 3), 123],
+        [(5, -1)] + [False]*32,
     ])
     def test_constructor_bits_types(self, pattern: list):
         with pytest.raises(RiscIntegerException) as exc:
@@ -131,6 +140,20 @@ class TestRiscInteger:
         c_integer = RiscInteger(c)
 
         assert a_integer - b_integer == c_integer
+        assert a_integer - b == c_integer
+
+    @pytest.mark.parametrize('a, b', [
+        (1, 1), (2**31-1, 1), (-2**31, -1), (-2**31, 1), (2**31-1, -1),
+        (-1, -1), (2**31-1, 2**31-1), (-2**31, -2**31), (0, -2**31),
+    ])
+    def test_overflows(self, a, b):
+        def overflows(n):
+            return not -2**31 <= n < 2**31
+
+        assert RiscInteger(a).add_overflows(RiscInteger(b)) is \
+            overflows(a + b)
+        assert RiscInteger(a).sub_overflows(RiscInteger(b)) is \
+            overflows(a - b)
 
     @pytest.mark.parametrize(
         'a, minus_a',
@@ -222,3 +245,63 @@ class TestRiscInteger:
     )
     def test_and(self, a, b, c):
         assert RiscInteger(a) & RiscInteger(b) == RiscInteger(c)
+
+    @pytest.mark.parametrize(
+        'a, b, c',
+        [
+            (0b1010, 0b0101, 0b1111),
+            (0b1111, 0b1001, 0b0110),
+            (-1, 0b0110, -7),
+            (0b0000, 0b0000, 0b0000),
+        ]
+    )
+    def test_xor(self, a, b, c):
+        assert RiscInteger(a) ^ RiscInteger(b) == RiscInteger(c)
+
+    @pytest.mark.parametrize(
+        'number, key, outcome',
+        [
+            (0b1101101, slice(0, 3), 0b101),
+            (0b1101101, slice(2, 7), 0b11011),
+            (-1, slice(25, None), 0b1111111),
+            (0b1101101, slice(5, 5), 0b0),
+            (0b1101101, slice(0, 7, 2), 0b1011),
+            (0b1101101, 1, False),
+            (0b1101101, 2, True),
+            (-2**31, -1, True),
+            (-2**31, 31, True),
+            (2**30, -1, False),
+        ]
+    )
+    def test_getitem(self, number, key, outcome):
+        assert RiscInteger(number)[key] == outcome
+
+    @pytest.mark.parametrize('other', [0b1010, None, '0b1010', [False] * 32])
+    def test_eq_other_types(self, other):
+        assert RiscInteger(0b1010) != other
+
+    def test_hash(self):
+        locations = {RiscInteger(4): 'a', RiscInteger(-4): 'b'}
+        assert locations[RiscInteger(4)] == 'a'
+        assert locations[RiscInteger(-4)] == 'b'
+
+    @pytest.mark.parametrize('word', [0, 1, 2**31, 2**32 - 1])
+    def test_from_word(self, word):
+        assert RiscInteger.from_word(word) == RiscInteger(word, signed=False)
+
+    @pytest.mark.parametrize('key', [32, -33])
+    def test_getitem_range(self, key):
+        with pytest.raises(IndexError):
+            RiscInteger(1)[key]
+
+    @pytest.mark.parametrize('number, bitstring, hexadecimal', [
+        (0, '0' * 32, '0x00000000'),
+        (6, '0' * 29 + '110', '0x00000006'),
+        (-1, '1' * 32, '0xFFFFFFFF'),
+        (-2**31, '1' + '0' * 31, '0x80000000'),
+    ])
+    def test_to_strings(self, number, bitstring, hexadecimal):
+        integer = RiscInteger(number)
+
+        assert integer.to_bitstring() == bitstring
+        assert integer.to_hex() == hexadecimal
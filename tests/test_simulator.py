@@ -1,39 +1,148 @@
+import functools
 import pytest
 
 from riscv.data import RiscInteger
+from riscv.implementation.arithmetic import AddRiscInstruction
+from riscv.instruction import RiscInstruction
 from riscv.simulator import RiscSimulator
 
 
+@functools.lru_cache(maxsize=None)
+def fib_rec(n):
+    if n == 0:
+        return 0
+    elif n == 1:
+        return 1
+    else:
+        return fib_rec(n-1) + fib_rec(n-2)
+
+
 class TestRiscSimulator:
+    # Parsed once and shared by every case below
+    FIBONACCI = RiscInstruction.parse([
+        'addi x2, x0, 1',
+        'addi x3, x0, 0',
+        'addi x4, x0, 1',
+        'blt x0, x1, check',
+        'addi x2, x0, 0',
+        'blt x0, x1, exit',
+        'loop:',
+        'add x5, x2, x3',
+        'add x3, x0, x2',
+        'add x2, x0, x5',
+        'addi x4, x4, 1',
+        'check:',
+        'blt x4, x1, loop',
+        'exit:',
+    ])
+
+    @pytest.mark.parametrize('jit', [True, False])
     @pytest.mark.parametrize('value', range(20))
-    def test_fibonnacci(self, value):
-        def fib_rec(n):
-            if n == 0:
-                return 0
-            elif n == 1:
-                return 1
-            else:
-                return fib_rec(n-1) + fib_rec(n-2)
+    def test_fibonnacci(self, value, jit):
+        s = RiscSimulator(self.FIBONACCI)
+        s.machine.registers[1] = RiscInteger(value)
+        s.simulate(jit=jit)
 
+        assert s.machine.registers[2] == RiscInteger(fib_rec(value))
+
+    def test_blocks(self):
         instructions = [
-            'addi x2, x0, 1',
-            'addi x3, x0, 0',
+            'addi x1, x0, 4',
+            'sw x1, 0(x1)',
+            'lw x2, 0(x1)',
+            'add x0, x2, x2',
+            'lw x3, 2(x1)',
             'addi x4, x0, 1',
-            'blt x0, x1, check',
-            'addi x2, x0, 0',
-            'blt x0, x1, exit',
-            'loop:',
-            'add x5, x2, x3',
-            'add x3, x0, x2',
-            'add x2, x0, x5',
-            'addi x4, x4, 1',
-            'check:',
-            'blt x4, x1, loop',
-            'exit:',
         ]
 
         s = RiscSimulator(instructions)
-        s.machine.registers[1] = RiscInteger(value)
+        with pytest.raises(Exception, match='Unaligned memory read'):
+            s.simulate(jit=False)
+
+        # The failing load reports its own location, not that of its block
+        assert s.machine.program_counter == 16
+        assert s.machine.registers[2] == RiscInteger(4)
+        assert s.machine.registers[4] == RiscInteger(0)
+        assert s.machine.protected_registers_written == {0}
+
+        # Entering halfway compiles a block starting there
+        s.machine.program_counter = 20
+        s.simulate(jit=False)
+        assert s.machine.program_counter == 24
+        assert s.machine.registers[4] == RiscInteger(1)
+
+    def test_blocks_unknown_register(self):
+        s = RiscSimulator(['addi x1, x0, 1', 'addi x40, x0, 1'])
+        with pytest.raises(Exception, match='unknown register'):
+            s.simulate(jit=False)
+
+        assert s.machine.registers[1] == RiscInteger(1)
+        assert s.machine.program_counter == 4
+
+    def test_instructions(self):
+        lines = ['addi x1, x0, 3', 'add x2, x1, x1']
+        for program in [lines, RiscInstruction.parse(lines)]:
+            s = RiscSimulator(program)
+            s.simulate()
+
+            assert s.machine.registers[2] == RiscInteger(6)
+
+        s = RiscSimulator([])
         s.simulate()
+        assert s.machine.program_counter == 0
 
-        assert s.machine.registers[2] == RiscInteger(fib_rec(value))
+    @pytest.mark.parametrize('jit', [True, False])
+    def test_simulate_batch(self, jit):
+        s = RiscSimulator([
+            'addi x3, x0, 0',
+            'blt x1, x2, exit',
+            'loop:',
+            'addi x3, x3, 1',
+            'addi x1, x1, -1',
+            'bge x1, x2, loop',
+            'exit:',
+            'sw x3, 0(x0)',
+        ])
+        inputs = [
+            {1: RiscInteger(a), 2: RiscInteger(b)}
+            for a, b in [(5, 0), (0, 5), (-3, -7), (10, 10)]
+        ]
+        machines = s.simulate_batch(inputs, jit=jit)
+
+        assert [m.read_memory(RiscInteger(0)) for m in machines] == \
+            [RiscInteger(6), RiscInteger(0), RiscInteger(5), RiscInteger(1)]
+        assert s.machine.program_counter == 0
+        assert s.machine.memory == {}
+
+    @pytest.mark.parametrize('jit', [True, False])
+    def test_blocks_modified_instruction(self, jit):
+        s = RiscSimulator(['addi x1, x0, 3', 'add x3, x1, x1'])
+        s.simulate(jit=jit)
+        assert s.machine.registers[3] == RiscInteger(6)
+
+        s.instructions[0].n = RiscInteger(5)
+        s.instructions[0].rd = 2
+        s.instructions[1] = AddRiscInstruction(4, 2, 0)
+        s.machine.program_counter = 0
+        s.simulate(jit=jit)
+
+        assert s.machine.registers[2] == RiscInteger(5)
+        assert s.machine.registers[4] == RiscInteger(5)
+
+    def test_blocks_protected_registers(self):
+        s = RiscSimulator(
+            ['addi x5, x0, 1', 'addi x6, x5, 1'],
+            protected_registers={5}
+        )
+        s.simulate(jit=False)
+
+        assert s.machine.registers[5] == RiscInteger(0)
+        assert s.machine.registers[6] == RiscInteger(1)
+        assert s.machine.protected_registers_written == {5}
+
+        s.machine.protected_registers = {0}
+        s.machine.program_counter = 0
+        s.simulate(jit=False)
+
+        assert s.machine.registers[5] == RiscInteger(1)
+        assert s.machine.registers[6] == RiscInteger(2)